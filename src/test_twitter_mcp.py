@@ -2,6 +2,9 @@
 Test file for Twitter MCP Server
 """
 import asyncio
+import time
+import pytest
+import twitter_mcp
 from twitter_mcp import app
 from fastapi.testclient import TestClient
 import os
@@ -108,6 +111,322 @@ def test_monitor_keywords():
         assert "followers" in influencer
         assert "tweet" in influencer
 
+def test_sentiment_cache_expiry_and_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(twitter_mcp, "clock", lambda: now[0])
+    monkeypatch.setattr(twitter_mcp, "sentiment_cache", twitter_mcp.OrderedDict())
+    response = twitter_mcp.MarketSentimentResponse(
+        symbol="AAPL", sentiment_score=0.5, sentiment_label="bullish", tweet_count=1,
+        common_topics=[], price_mentions={}, bullish_ratio=1.0
+    )
+    twitter_mcp.cache_sentiment("AAPL", response)
+    
+    now[0] += twitter_mcp.CACHE_DURATION
+    assert twitter_mcp.get_cached_sentiment("AAPL") is None
+    assert twitter_mcp.get_cached_sentiment("AAPL", allow_stale=True) is response
+    
+    # Writing another symbol past the stale window evicts the old entry
+    now[0] += twitter_mcp.STALE_CACHE_DURATION
+    twitter_mcp.cache_sentiment("TSLA", response)
+    assert list(twitter_mcp.sentiment_cache) == ["TSLA"]
+    
+    # The oldest write is evicted once the cache is over its size bound
+    monkeypatch.setattr(twitter_mcp, "CACHE_MAX_ENTRIES", 2)
+    twitter_mcp.cache_sentiment("MSFT", response)
+    twitter_mcp.cache_sentiment("AAPL", response)
+    assert list(twitter_mcp.sentiment_cache) == ["MSFT", "AAPL"]
+
+def test_adopted_cache_entries_keep_timestamp_order(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(twitter_mcp, "clock", lambda: now[0])
+    cache = twitter_mcp.OrderedDict()
+    twitter_mcp.store_in_cache(cache, "old", 1, max_age=60, max_entries=10)
+    now[0] += 30
+    twitter_mcp.store_in_cache(cache, "new", 2, max_age=60, max_entries=10)
+    
+    # An entry adopted with an age lands between the writes it falls between
+    twitter_mcp.store_in_cache(cache, "adopted", 3, max_age=60, max_entries=10, age=20)
+    assert list(cache) == ["old", "adopted", "new"]
+    
+    # So expiry still only has to look at the head
+    now[0] += 45
+    twitter_mcp.store_in_cache(cache, "latest", 4, max_age=60, max_entries=10)
+    assert list(cache) == ["new", "latest"]
+
+def test_shared_sentiment_cache_round_trip(monkeypatch):
+    class FakeRedis:
+        def __init__(self):
+            self.data = {}
+        async def get(self, key):
+            return self.data.get(key)
+        async def set(self, key, value, ex=None):
+            self.data[key] = value
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(twitter_mcp, "get_redis", lambda: fake_redis)
+    monkeypatch.setattr(twitter_mcp, "sentiment_cache", twitter_mcp.OrderedDict())
+    response = twitter_mcp.MarketSentimentResponse(
+        symbol="AAPL", sentiment_score=0.2, sentiment_label="bullish", tweet_count=3,
+        common_topics=[], price_mentions={"$150": 2}, bullish_ratio=1.0
+    )
+    
+    async def run():
+        await twitter_mcp.store_shared_sentiment("AAPL", response)
+        return await twitter_mcp.load_shared_sentiment("AAPL")
+    
+    # A worker with an empty local cache picks up the shared entry and keeps it locally
+    assert asyncio.run(run()) == response
+    assert twitter_mcp.get_cached_sentiment("AAPL") == response
+    
+    # Entries that are not valid JSON or no longer match the model are misses
+    for raw in ["not json", '{"cached_at": 0}', '{"cached_at": 1e12, "response": {"symbol": "AAPL"}}']:
+        fake_redis.data["sentiment:TSLA"] = raw
+        assert asyncio.run(twitter_mcp.load_shared_sentiment("TSLA")) is None
+
+def test_startup_refuses_redis_url_without_redis(monkeypatch):
+    monkeypatch.setattr(twitter_mcp, "REDIS_URL", "redis://localhost:6379/0")
+    monkeypatch.setattr(twitter_mcp, "aioredis", None)
+    with pytest.raises(RuntimeError):
+        asyncio.run(twitter_mcp.lifespan(app).__aenter__())
+
+def test_token_bucket_refuses_then_refills(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(twitter_mcp, "clock", lambda: now[0])
+    bucket = twitter_mcp.TokenBucket(capacity=2, window_seconds=10)
+    
+    bucket.acquire()
+    bucket.acquire()
+    with pytest.raises(twitter_mcp.SearchBudgetExhausted) as exc_info:
+        bucket.acquire()
+    assert exc_info.value.retry_after == 5
+    
+    now[0] += 5  # One token refills every 5 seconds
+    bucket.acquire()
+
+def test_token_bucket_follows_twitter_rate_limit_headers(monkeypatch):
+    monkeypatch.setattr(twitter_mcp, "clock", lambda: 0.0)
+    monkeypatch.setattr(twitter_mcp, "wall_clock", lambda: 1000.0)
+    bucket = twitter_mcp.TokenBucket(capacity=450, window_seconds=900)
+    
+    # Twitter reports the window spent with 60 seconds until it resets
+    bucket.sync(remaining=0, reset_at=1060.0)
+    with pytest.raises(twitter_mcp.SearchBudgetExhausted) as exc_info:
+        bucket.acquire()
+    assert exc_info.value.retry_after >= 60
+
+def test_search_budget_waits_briefly_for_a_token(monkeypatch):
+    now = [0.0]
+    async def fake_sleep(seconds):
+        now[0] += seconds
+    monkeypatch.setattr(twitter_mcp, "clock", lambda: now[0])
+    monkeypatch.setattr(twitter_mcp, "sleep", fake_sleep)
+    monkeypatch.setattr(twitter_mcp, "search_budget", twitter_mcp.TokenBucket(capacity=1, window_seconds=1))
+    monkeypatch.setattr(twitter_mcp, "TWITTER_MAX_WAIT", 2)
+    
+    async def run():
+        await twitter_mcp.acquire_search_budget()
+        await twitter_mcp.acquire_search_budget()  # Refills within the wait
+        assert now[0] == 1
+        monkeypatch.setattr(twitter_mcp, "search_budget", twitter_mcp.TokenBucket(capacity=1, window_seconds=10))
+        await twitter_mcp.acquire_search_budget()
+        with pytest.raises(twitter_mcp.SearchBudgetExhausted):
+            await twitter_mcp.acquire_search_budget()  # Would take longer than the wait
+    
+    asyncio.run(run())
+
+def test_concurrent_sentiment_requests_share_one_fetch(monkeypatch):
+    calls = []
+    async def fake_search(query, max_results):
+        calls.append(query)
+        await asyncio.sleep(0.01)
+        return twitter_mcp.tweepy.Response(data=None, includes={}, errors=[], meta={})
+    monkeypatch.setattr(twitter_mcp, "search_tweets", fake_search)
+    monkeypatch.setattr(twitter_mcp, "sentiment_cache", twitter_mcp.OrderedDict())
+    
+    async def run():
+        request = twitter_mcp.MarketSentimentRequest(symbol="AAPL")
+        return await asyncio.gather(*(twitter_mcp.analyze_market_sentiment(request) for _ in range(3)))
+    
+    responses = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r.tweet_count == 0 for r in responses)
+    assert not twitter_mcp.sentiment_inflight
+
+def test_search_results_cached_briefly(monkeypatch):
+    """Repeating a query within the cache window does not call Twitter again"""
+    calls = []
+    class FakeClient:
+        def search_recent_tweets(self, **kwargs):
+            calls.append(kwargs["query"])
+            return twitter_mcp.tweepy.Response(data=None, includes={}, errors=[], meta={})
+    monkeypatch.setattr(twitter_mcp, "get_twitter_client", lambda: FakeClient())
+    monkeypatch.setattr(twitter_mcp, "search_cache", twitter_mcp.OrderedDict())
+    now = [1000.0]
+    monkeypatch.setattr(twitter_mcp, "clock", lambda: now[0])
+    # A budget on the same fake clock, so the jump below does not drain the shared one
+    monkeypatch.setattr(twitter_mcp, "search_budget", twitter_mcp.TokenBucket(capacity=10, window_seconds=900))
+    
+    async def run():
+        await twitter_mcp.search_tweets("$AAPL", 10)
+        await twitter_mcp.search_tweets("$AAPL", 10)
+        now[0] += twitter_mcp.SEARCH_CACHE_DURATION
+        await twitter_mcp.search_tweets("$AAPL", 10)
+    
+    asyncio.run(run())
+    assert calls == ["$AAPL", "$AAPL"]
+
+def test_watchlist_prices_attributed_to_tagged_symbol(monkeypatch):
+    monkeypatch.setattr(twitter_mcp, "tweet_polarity", lambda text: 0.5)
+    monkeypatch.setattr(twitter_mcp, "tweet_noun_phrases", lambda text: ())
+    # The monitor reports no bullish ratio, so it never classifies tweets
+    monkeypatch.setattr(twitter_mcp, "tweet_leaning", None)
+    texts_by_symbol = {"AAPL": ["$AAPL at $200"], "TSLA": ["$TSLA at $100, AAPL lagging"]}
+    response = twitter_mcp.analyze_watchlist(["AAPL", "TSLA"], texts_by_symbol)
+    # An untagged "AAPL" in a TSLA tweet does not pull its price into AAPL
+    assert response.price_sentiment_correlation == {"AAPL": 100.0, "TSLA": 50.0}
+
+def test_search_symbols_normalizes_tickers(monkeypatch):
+    queries = []
+    async def fake_search(query, max_results):
+        queries.append(query)
+        tweets = [twitter_mcp.tweepy.Tweet({"id": "1", "text": "$AAPL looking strong", "edit_history_tweet_ids": ["1"]})]
+        return twitter_mcp.tweepy.Response(data=tweets, includes={}, errors=[], meta={})
+    monkeypatch.setattr(twitter_mcp, "search_tweets", fake_search)
+    grouped = asyncio.run(twitter_mcp.search_symbols(["$AAPL", "aapl"], 10))
+    assert queries == ["($AAPL OR #AAPL) lang:en -is:retweet"]
+    assert grouped == {"$AAPL": ["$AAPL looking strong"], "aapl": ["$AAPL looking strong"]}
+
+def test_trends_accept_null_min_tweets(monkeypatch):
+    requested = []
+    async def fake_search(query, max_results):
+        requested.append(max_results)
+        return twitter_mcp.tweepy.Response(data=None, includes={}, errors=[], meta={})
+    monkeypatch.setattr(twitter_mcp, "search_tweets", fake_search)
+    response = client.post("/mcp/analyze_market_trends", json={"symbols": ["AAPL", "TSLA"], "min_tweets": None})
+    assert response.status_code == 200
+    assert requested == [100]
+
+def test_concurrent_identical_searches_share_one_request(monkeypatch):
+    calls = []
+    class FakeClient:
+        def search_recent_tweets(self, **kwargs):
+            calls.append(kwargs["query"])
+            time.sleep(0.05)
+            return twitter_mcp.tweepy.Response(data=None, includes={}, errors=[], meta={})
+    monkeypatch.setattr(twitter_mcp, "get_twitter_client", lambda: FakeClient())
+    monkeypatch.setattr(twitter_mcp, "search_cache", twitter_mcp.OrderedDict())
+    monkeypatch.setattr(twitter_mcp, "search_semaphore", None)
+    
+    async def run():
+        return await asyncio.gather(*(twitter_mcp.search_tweets("$AAPL", 10) for _ in range(3)))
+    
+    asyncio.run(run())
+    assert calls == ["$AAPL"]
+    assert not twitter_mcp.search_inflight
+
+def test_twitter_client_pools_connections():
+    """The shared client keeps enough pooled connections for every concurrent search"""
+    adapter = twitter_mcp.get_twitter_client().session.get_adapter("https://api.twitter.com")
+    assert adapter._pool_maxsize == twitter_mcp.TWITTER_CONCURRENCY
+
+def test_mcp_capabilities():
+    response = client.get("/mcp/capabilities")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    capability_names = [c["name"] for c in response.json()["capabilities"]]
+    assert capability_names == ["analyze_market_sentiment", "analyze_market_trends", "monitor_market"]
+
+def test_vader_lexicon_downloaded_once(monkeypatch):
+    """A missing lexicon is fetched once even if the analyzer keeps failing to load"""
+    downloads = []
+    def missing_lexicon():
+        raise LookupError("vader_lexicon")
+    monkeypatch.setattr(twitter_mcp, "SentimentIntensityAnalyzer", missing_lexicon)
+    monkeypatch.setattr(twitter_mcp.nltk, "download", lambda name, quiet: downloads.append(name))
+    twitter_mcp.download_vader_lexicon.cache_clear()
+    twitter_mcp.get_sentiment_analyzer.cache_clear()
+    try:
+        for _ in range(2):
+            with pytest.raises(LookupError):
+                twitter_mcp.get_sentiment_analyzer()
+    finally:
+        twitter_mcp.download_vader_lexicon.cache_clear()
+        twitter_mcp.get_sentiment_analyzer.cache_clear()
+    assert downloads == ["vader_lexicon"]
+
+def test_combined_symbol_search_query():
+    query = twitter_mcp.build_search_query(["AAPL", "TSLA"])
+    assert query == "($AAPL OR #AAPL OR $TSLA OR #TSLA) lang:en -is:retweet"
+
+def test_symbols_chunked_under_query_limit():
+    symbols = ["AAPL", "TSLA", "MSFT", "NVDA", "AMZN"]
+    limit = len(twitter_mcp.build_search_query(symbols[:2]))
+    chunks = twitter_mcp.chunk_symbols(symbols, limit)
+    assert chunks == [["AAPL", "TSLA"], ["MSFT", "NVDA"], ["AMZN"]]
+    assert all(len(twitter_mcp.build_search_query(chunk)) <= limit for chunk in chunks)
+
+def test_normalize_symbol():
+    assert {twitter_mcp.normalize_symbol(s) for s in ["AAPL", "$aapl", "#AAPL", " aapl "]} == {"AAPL"}
+
+def test_group_texts_by_symbol():
+    texts = ["Buying $aapl and #TSLA", "$AAPLX is a different ticker", "$AAPL $AAPL twice"]
+    grouped = twitter_mcp.group_texts_by_symbol(texts, ["AAPL", "TSLA", "MSFT"])
+    assert grouped == {
+        "AAPL": ["Buying $aapl and #TSLA", "$AAPL $AAPL twice"],
+        "TSLA": ["Buying $aapl and #TSLA"],
+        "MSFT": []
+    }
+    
+    # Spellings that differ only in case each get the ticker's tweets
+    assert twitter_mcp.group_texts_by_symbol(["$AAPL up"], ["AAPL", "aapl"]) == {"AAPL": ["$AAPL up"], "aapl": ["$AAPL up"]}
+
+def test_summarize_tweets_counts_price_mentions(monkeypatch):
+    monkeypatch.setattr(twitter_mcp, "tweet_polarity", len)
+    texts = ["$AAPL to $150 today", "150$ or $155.50?", "no prices here"]
+    _, price_mentions, _ = twitter_mcp.summarize_tweets(texts)
+    assert price_mentions == {"$150": 1, "150$": 1, "$155.50": 1}
+    assert type(price_mentions) is dict
+
+def test_summarize_tweets_bullish_ratio_matches_whole_words(monkeypatch):
+    monkeypatch.setattr(twitter_mcp, "tweet_polarity", len)
+    texts = [
+        "Loading up on calls, $AAPL to the moon!",
+        "Feeling bullish",
+        "Time to sell, this will crash",
+        "Strong support at $150",  # "up" inside "support" is not a signal
+    ]
+    assert twitter_mcp.summarize_tweets(texts)[2] == 2 / 3
+    assert twitter_mcp.summarize_tweets(["nothing to see"])[2] == 0.5
+    
+    # Inflected forms still count
+    for word in ["buys", "longs", "mooning", "upgrade"]:
+        assert twitter_mcp.tweet_leaning(f"Analyst {word} $AAPL") == (True, False)
+    for word in ["sells", "shorts", "crashing", "crashed", "downgrade"]:
+        assert twitter_mcp.tweet_leaning(f"Analyst {word} $AAPL") == (False, True)
+
+def test_summarize_tweets_single_pass(monkeypatch):
+    monkeypatch.setattr(twitter_mcp, "tweet_polarity", len)
+    texts = ["Buying $AAPL at $150", "Selling at 160$, this will crash", "Buying $AAPL at $150"]
+    sentiments, price_mentions, bullish_ratio = twitter_mcp.summarize_tweets(texts)
+    assert sentiments == [len(text) for text in texts]
+    assert price_mentions == {"$150": 2, "160$": 1}
+    assert bullish_ratio == 2 / 3
+
+def test_extract_market_topics_filters_finance_phrases(monkeypatch):
+    phrases = {
+        "Stock market rally, nice weather": ("stock market rally", "nice weather"),
+        "Stock market rally lifts the retail investor": ("stock market rally", "retail investor"),
+    }
+    # Tweets without any finance term never reach the tagger
+    monkeypatch.setattr(twitter_mcp, "tweet_noun_phrases", lambda text: phrases[text])
+    texts = list(phrases) + ["Lunch with friends"]
+    assert twitter_mcp.extract_market_topics(texts) == ["stock market rally", "retail investor"]
+    assert twitter_mcp.extract_market_topics(texts, max_topics=1) == ["stock market rally"]
+
+def test_finance_sentences_keeps_only_finance_sentences():
+    text = "Lunch was great. Stock is at $150.25 today! See you soon."
+    assert twitter_mcp.finance_sentences(text) == "Stock is at $150.25 today!"
+    assert twitter_mcp.finance_sentences("Lunch was great.") == ""
+
 if __name__ == "__main__":
     print("Running tests...")
     test_health_check()
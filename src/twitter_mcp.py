@@ -3,29 +3,68 @@ Twitter Market Sentiment MCP Server
 Provides financial market sentiment analysis through Twitter data
 """
 
-from fastapi import FastAPI, HTTPException, APIRouter
+from fastapi import FastAPI, HTTPException, APIRouter, Response
 from textblob import TextBlob
+from textblob.download_corpora import MIN_CORPORA as TEXTBLOB_CORPORA
+from textblob.exceptions import MissingCorpusError
+import nltk
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
 import tweepy
 from tweepy import errors as tweepy_errors
 from typing import Dict, List, Optional, Tuple
 import os
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from collections import Counter
+from collections import Counter, OrderedDict
 import re
+import json
 from datetime import datetime, timedelta
 import time
+import asyncio
+import threading
+from functools import lru_cache
+from contextlib import asynccontextmanager
+from requests.adapters import HTTPAdapter
+from statistics import fmean
+from heapq import nlargest
+from itertools import islice
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # Only needed when REDIS_URL is set
+    aioredis = None
 
 # Load environment variables
 load_dotenv()
 
+# Time sources are looked up through these names so tests can swap them
+clock = time.monotonic  # Local timestamps and deadlines
+wall_clock = time.time  # Timestamps compared with Twitter or other workers
+sleep = asyncio.sleep
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build shared services once per worker and release them on shutdown"""
+    if REDIS_URL and aioredis is None:
+        raise RuntimeError("REDIS_URL is set but the redis package is not installed (pip install redis)")
+    get_twitter_client()
+    # Load NLTK data and train TextBlob's chunker now rather than on the first request
+    await asyncio.to_thread(warm_nlp_models)
+    yield
+    # Don't leave sentiment fetches or searches running against a closing worker
+    for task in [*sentiment_inflight.values(), *search_inflight.values()]:
+        task.cancel()
+    get_twitter_client().session.close()
+    if get_redis() is not None:
+        await get_redis().aclose()
+
 # Initialize FastAPI app with Smithery-compatible configuration
 app = FastAPI(
     title="Twitter Market Sentiment MCP",
     description="Financial market sentiment analysis using Twitter data",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Initialize MCP router with tags for better documentation
@@ -34,14 +73,217 @@ mcp = APIRouter(
     tags=["Market Sentiment Analysis"]
 )
 
-# Twitter API setup
-client = tweepy.Client(
-    bearer_token=os.getenv("TWITTER_BEARER_TOKEN"),
-    consumer_key=os.getenv("TWITTER_API_KEY"),
-    consumer_secret=os.getenv("TWITTER_API_SECRET"),
-    access_token=os.getenv("TWITTER_ACCESS_TOKEN"),
-    access_token_secret=os.getenv("TWITTER_ACCESS_TOKEN_SECRET")
-)
+# Concurrent searches allowed; bursts beyond this queue instead of piling up 429s
+TWITTER_CONCURRENCY = int(os.getenv("TWITTER_CONCURRENCY", "8"))
+
+# Twitter API setup. Every Twitter call must go through this one client so
+# requests share its HTTP session and reuse pooled keep-alive connections
+# instead of paying a TCP and TLS handshake per search.
+@lru_cache(maxsize=1)
+def get_twitter_client() -> tweepy.Client:
+    """Build the Twitter API client on first use and reuse it for the process"""
+    client = tweepy.Client(
+        bearer_token=os.getenv("TWITTER_BEARER_TOKEN"),
+        consumer_key=os.getenv("TWITTER_API_KEY"),
+        consumer_secret=os.getenv("TWITTER_API_SECRET"),
+        access_token=os.getenv("TWITTER_ACCESS_TOKEN"),
+        access_token_secret=os.getenv("TWITTER_ACCESS_TOKEN_SECRET")
+    )
+    # Keep one idle connection per concurrent search so threads never open extras
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TWITTER_CONCURRENCY)
+    client.session.mount("https://", adapter)
+    client.session.hooks["response"].append(sync_search_budget)
+    return client
+
+def sync_search_budget(response, *args, **kwargs):
+    """Calibrate the local search budget from Twitter's rate-limit headers"""
+    remaining = response.headers.get("x-rate-limit-remaining")
+    reset_at = response.headers.get("x-rate-limit-reset")
+    if remaining is not None and reset_at is not None and "/tweets/search/recent" in response.url:
+        search_budget.sync(int(remaining), float(reset_at))
+
+# Local search budget mirroring Twitter's recent-search rate limit
+TWITTER_SEARCH_LIMIT = int(os.getenv("TWITTER_SEARCH_LIMIT", "450"))
+TWITTER_SEARCH_WINDOW = 900  # Twitter rate limits reset every 15 minutes
+
+class SearchBudgetExhausted(Exception):
+    """Raised when the local search budget is spent before calling Twitter"""
+    def __init__(self, retry_after: float):
+        super().__init__(f"Search budget exhausted, retry after {retry_after:.0f} seconds")
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Constant-memory token bucket: one float of tokens and the last refill time"""
+    def __init__(self, capacity: int, window_seconds: float):
+        self.capacity = capacity
+        self.rate = capacity / window_seconds
+        self.tokens = float(capacity)
+        self.last_refill = clock()
+        # acquire() runs on the event loop while sync() runs in tweepy's worker threads
+        self.lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        """Take one token, raising SearchBudgetExhausted if none are left"""
+        with self.lock:
+            now = clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            if self.tokens < 1:
+                raise SearchBudgetExhausted((1 - self.tokens) / self.rate)
+            self.tokens -= 1
+    
+    def sync(self, remaining: int, reset_at: float) -> None:
+        """Never hold more tokens than Twitter says remain; if none do, refill only after reset"""
+        with self.lock:
+            now = clock()
+            self.tokens = min(self.tokens, remaining)
+            if remaining == 0:
+                # A refill time in the future makes acquire() refuse until Twitter's window resets
+                self.tokens = 0.0
+                self.last_refill = now + max(0.0, reset_at - wall_clock())
+
+search_budget = TokenBucket(TWITTER_SEARCH_LIMIT, TWITTER_SEARCH_WINDOW)
+
+# Wait this long for a token before refusing, so bursts are paced instead of rejected
+TWITTER_MAX_WAIT = float(os.getenv("TWITTER_MAX_WAIT", "2"))
+
+async def acquire_search_budget() -> None:
+    """Take a search token, sleeping for it when one refills within TWITTER_MAX_WAIT"""
+    deadline = clock() + TWITTER_MAX_WAIT
+    while True:
+        try:
+            search_budget.acquire()
+            return
+        except SearchBudgetExhausted as e:
+            if clock() + e.retry_after > deadline:
+                raise
+            await sleep(e.retry_after)
+
+# Cap concurrent searches so bursts queue here instead of piling up 429s
+search_semaphore: Optional[asyncio.Semaphore] = None
+
+def get_search_semaphore() -> asyncio.Semaphore:
+    """Create the search semaphore on first use, inside the running event loop"""
+    global search_semaphore
+    if search_semaphore is None:
+        search_semaphore = asyncio.Semaphore(TWITTER_CONCURRENCY)
+    return search_semaphore
+
+def store_in_cache(cache: OrderedDict, key, value, max_age: float, max_entries: int, age: float = 0) -> None:
+    """Store a timestamped value, evicting the oldest entries once past max_age or over max_entries"""
+    now = clock()
+    timestamp = now - age
+    cache[key] = (timestamp, value)
+    cache.move_to_end(key)
+    if age:
+        # An adopted entry can predate recent writes, so move those back behind it
+        newer = []
+        for other in islice(reversed(cache), 1, None):
+            if cache[other][0] <= timestamp:
+                break
+            newer.append(other)
+        for other in reversed(newer):
+            cache.move_to_end(other)
+    cutoff = now - max_age
+    # Entries are kept in timestamp order, so only the head can be past the cutoff
+    while cache and next(iter(cache.values()))[0] < cutoff:
+        cache.popitem(last=False)
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
+
+# Short-lived cache of raw search results so repeated queries skip the API entirely
+search_cache: OrderedDict[Tuple[str, int], Tuple[float, tweepy.Response]] = OrderedDict()
+SEARCH_CACHE_DURATION = 60  # Recent search results are effectively unchanged within a minute
+SEARCH_CACHE_MAX_ENTRIES = 1024
+search_inflight: Dict[Tuple[str, int], asyncio.Future] = {}  # Searches currently running, by query
+
+async def search_tweets(query: str, max_results: int) -> tweepy.Response:
+    """Search recent tweets, refusing locally instead of spending a request Twitter would reject"""
+    key = (query, max_results)
+    now = clock()
+    entry = search_cache.get(key)
+    if entry is not None and now - entry[0] < SEARCH_CACHE_DURATION:
+        return entry[1]
+    
+    # Concurrent identical searches share one request and one budget token
+    task = search_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fetch_search_results(query, max_results))
+        search_inflight[key] = task
+        task.add_done_callback(lambda _: search_inflight.pop(key, None))
+    # Shield so one cancelled caller does not cancel the search for the others
+    return await asyncio.shield(task)
+
+async def fetch_search_results(query: str, max_results: int) -> tweepy.Response:
+    """Spend a budget token on one recent search and cache its results"""
+    await acquire_search_budget()
+    async with get_search_semaphore():
+        # tweepy.Client is blocking, so run the HTTP call off the event loop
+        tweets = await asyncio.to_thread(
+            get_twitter_client().search_recent_tweets,
+            query=query,
+            max_results=max_results,
+            tweet_fields=['created_at', 'public_metrics']
+        )
+    
+    store_in_cache(search_cache, (query, max_results), tweets, SEARCH_CACHE_DURATION, SEARCH_CACHE_MAX_ENTRIES)
+    return tweets
+
+MAX_SEARCH_RESULTS = 100  # Twitter caps recent search at 100 tweets per request
+# Longest query the API tier accepts (512 on Basic, 4096 on Pro)
+TWITTER_QUERY_MAX_LENGTH = int(os.getenv("TWITTER_QUERY_MAX_LENGTH", "512"))
+
+def normalize_symbol(symbol: str) -> str:
+    """Canonical form of a ticker: no cashtag or hashtag prefix, upper case"""
+    return symbol.strip().lstrip("$#").upper()
+
+def build_search_query(symbols: List[str]) -> str:
+    """Build one recent-search query matching the cashtag or hashtag of any symbol"""
+    terms = " OR ".join(f"${symbol} OR #{symbol}" for symbol in symbols)
+    # Group the ORs so the language and retweet filters apply to every term
+    return f"({terms}) lang:en -is:retweet"
+
+def group_texts_by_symbol(texts: List[str], symbols: List[str]) -> Dict[str, List[str]]:
+    """Bucket tweets from a combined search by the symbols they tag"""
+    # Several spellings of one ticker ("AAPL", "$aapl") all receive its tweets
+    by_tag = {}
+    for symbol in dict.fromkeys(symbols):
+        by_tag.setdefault(normalize_symbol(symbol), []).append(symbol)
+    tag_pattern = re.compile(r"[$#](" + "|".join(map(re.escape, by_tag)) + r")\b", re.IGNORECASE)
+    grouped = {symbol: [] for symbol in symbols}
+    for text in texts:
+        for tag in {match.upper() for match in tag_pattern.findall(text)}:
+            for symbol in by_tag[tag]:
+                grouped[symbol].append(text)
+    return grouped
+
+def chunk_symbols(symbols: List[str], max_length: int) -> List[List[str]]:
+    """Split symbols into as few groups as possible whose combined query fits max_length"""
+    chunks = []
+    for symbol in symbols:
+        if chunks and len(build_search_query(chunks[-1] + [symbol])) <= max_length:
+            chunks[-1].append(symbol)
+        else:
+            chunks.append([symbol])
+    return chunks
+
+async def search_symbols(symbols: List[str], results_per_symbol: int) -> Dict[str, List[str]]:
+    """Fetch tweets for several symbols with as few searches as the query limit allows and split them per symbol"""
+    if not symbols:
+        return {}
+    # Query each canonical ticker once, however many spellings of it were requested
+    tickers = list(dict.fromkeys(map(normalize_symbol, symbols)))
+    chunks = chunk_symbols(tickers, TWITTER_QUERY_MAX_LENGTH)
+    responses = await asyncio.gather(*(
+        search_tweets(
+            build_search_query(chunk),
+            max_results=max(10, min(MAX_SEARCH_RESULTS, results_per_symbol * len(chunk)))
+        )
+        for chunk in chunks
+    ))
+    # A tweet tagging symbols from two chunks comes back twice, so keep one copy per id
+    texts = list({tweet.id: tweet.text for tweets in responses if tweets.data for tweet in tweets.data}.values())
+    return group_texts_by_symbol(texts, symbols)
 
 # Pydantic models
 class MarketSentimentRequest(BaseModel):
@@ -79,140 +321,312 @@ class MarketMonitorResponse(BaseModel):
     trending_topics: List[str]
     price_sentiment_correlation: Dict[str, float]
 
-# Add cache for sentiment analysis results
-sentiment_cache: Dict[str, Tuple[float, MarketSentimentResponse]] = {}
+# Add cache for sentiment analysis results, ordered from oldest to newest write
+sentiment_cache: OrderedDict[str, Tuple[float, MarketSentimentResponse]] = OrderedDict()
 CACHE_DURATION = 300  # Cache results for 5 minutes
+STALE_CACHE_DURATION = 3600  # Keep expired results for an hour as a rate-limit fallback
+CACHE_MAX_ENTRIES = 10_000  # Bound memory when many distinct symbols are requested
+sentiment_inflight: Dict[str, asyncio.Future] = {}  # Fetches currently running, by symbol
 
-def extract_price_mentions(texts: List[str]) -> Dict[str, int]:
-    """Extract price mentions from tweets using regex"""
-    price_pattern = r'\$\d+\.?\d*|\d+\.?\d*\$'
-    prices = []
-    for text in texts:
-        matches = re.findall(price_pattern, text)
-        prices.extend(matches)
-    return Counter(prices)
+def get_cached_sentiment(symbol: str, allow_stale: bool = False) -> Optional[MarketSentimentResponse]:
+    """Return the cached response for a symbol, or None if missing or expired"""
+    entry = sentiment_cache.get(symbol)
+    if entry is None:
+        return None
+    timestamp, response = entry
+    max_age = STALE_CACHE_DURATION if allow_stale else CACHE_DURATION
+    return response if clock() - timestamp < max_age else None
 
-def calculate_bullish_ratio(texts: List[str]) -> float:
-    """Calculate ratio of bullish to bearish tweets"""
+def cache_sentiment(symbol: str, response: MarketSentimentResponse, age: float = 0) -> None:
+    """Cache a response, evicting the oldest entries once stale or over the size bound"""
+    store_in_cache(sentiment_cache, symbol, response, STALE_CACHE_DURATION, CACHE_MAX_ENTRIES, age=age)
+
+# Optional shared cache so every worker benefits from any worker's fetch
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_TIMEOUT = 0.25  # Seconds; an unreachable cache must cost less than the search it would save
+
+@lru_cache(maxsize=1)
+def get_redis() -> Optional["aioredis.Redis"]:
+    """Connect to the shared cache on first use, or None when REDIS_URL is not set"""
+    # lifespan() has already refused to start if REDIS_URL is set without redis installed
+    if not REDIS_URL:
+        return None
+    return aioredis.Redis.from_url(REDIS_URL, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
+
+async def load_shared_sentiment(symbol: str, allow_stale: bool = False) -> Optional[MarketSentimentResponse]:
+    """Read a response another worker cached, adopting it into the local cache"""
+    redis = get_redis()
+    if redis is None:
+        return None
+    try:
+        raw = await redis.get(f"sentiment:{symbol}")
+    except aioredis.RedisError:
+        # The shared cache is an optimization; carry on as a miss if it is down
+        return None
+    if raw is None:
+        return None
+    try:
+        entry = json.loads(raw)
+        # Wall-clock age, since monotonic clocks are not comparable across processes
+        age = max(0.0, wall_clock() - entry["cached_at"])
+        max_age = STALE_CACHE_DURATION if allow_stale else CACHE_DURATION
+        if age >= max_age:
+            return None
+        response = MarketSentimentResponse.model_validate(entry["response"])
+    except (ValueError, KeyError, TypeError):
+        # Malformed or written by an older schema (ValidationError is a ValueError)
+        return None
+    cache_sentiment(symbol, response, age=age)
+    return response
+
+async def store_shared_sentiment(symbol: str, response: MarketSentimentResponse) -> None:
+    """Publish a fresh response to the shared cache for the other workers"""
+    redis = get_redis()
+    if redis is None:
+        return
+    payload = json.dumps({"cached_at": wall_clock(), "response": response.model_dump()})
+    try:
+        # Keep it through the stale window so rate-limited workers can fall back to it
+        await redis.set(f"sentiment:{symbol}", payload, ex=STALE_CACHE_DURATION)
+    except aioredis.RedisError:
+        pass
+
+@lru_cache(maxsize=1)
+def download_vader_lexicon() -> None:
+    """Fetch the VADER lexicon, at most once per process"""
+    nltk.download('vader_lexicon', quiet=True)
+
+@lru_cache(maxsize=1)
+def get_sentiment_analyzer() -> SentimentIntensityAnalyzer:
+    """Build the VADER analyzer once per process, fetching its lexicon if missing"""
+    try:
+        return SentimentIntensityAnalyzer()
+    except LookupError:
+        download_vader_lexicon()
+        return SentimentIntensityAnalyzer()
+
+@lru_cache(maxsize=4096)
+def tweet_polarity(text: str) -> float:
+    """VADER compound polarity (-1 to 1) for one tweet, memoized by text"""
+    return get_sentiment_analyzer().polarity_scores(text)["compound"]
+
+def mean_sentiment(sentiments: List[float]) -> float:
+    """Average polarity with compensated (fsum) summation, 0 for an empty batch"""
+    return fmean(sentiments) if sentiments else 0.0
+
+# Every price mention contains a '$', so tweets without one skip the regex entirely
+PRICE_PATTERN = re.compile(r'\$\d+\.?\d*|\d+\.?\d*\$')
+
+# Whole-word vocabularies, including the inflections substring matching used to catch
+BULLISH_WORDS = frozenset({
+    'buy', 'buys', 'buying', 'buyer', 'buyers',
+    'bull', 'bulls', 'bullish',
+    'long', 'longs',
+    'up', 'upgrade', 'upgrades', 'upgraded', 'uptrend',
+    'calls',
+    'moon', 'moons', 'mooning',
+    'higher',
+})
+BEARISH_WORDS = frozenset({
+    'sell', 'sells', 'selling', 'seller', 'sellers', 'selloff',
+    'bear', 'bears', 'bearish',
+    'short', 'shorts', 'shorting', 'shorted',
+    'down', 'downgrade', 'downgrades', 'downgraded', 'downtrend',
+    'puts',
+    'crash', 'crashes', 'crashed', 'crashing',
+    'lower',
+})
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+def tweet_leaning(text: str) -> Tuple[bool, bool]:
+    """Whether one tweet uses bullish and/or bearish vocabulary"""
+    # Tokenize once, then two hash-set checks instead of a substring scan per word
+    words = set(WORD_PATTERN.findall(text.lower()))
+    return not BULLISH_WORDS.isdisjoint(words), not BEARISH_WORDS.isdisjoint(words)
+
+def leaning_ratio(bullish_count: int, bearish_count: int) -> float:
+    """Share of bullish among leaning tweets, 0.5 when none lean either way"""
+    total = bullish_count + bearish_count
+    return bullish_count / total if total > 0 else 0.5
+
+def summarize_tweets(texts: List[str]) -> Tuple[List[float], Dict[str, int], float]:
+    """Polarity scores, price mentions and bullish ratio for a batch in a single pass over the tweets"""
+    sentiments = []
+    price_mentions = Counter()
     bullish_count = 0
     bearish_count = 0
-    bullish_words = {'buy', 'bull', 'long', 'up', 'calls', 'moon', 'higher'}
-    bearish_words = {'sell', 'bear', 'short', 'down', 'puts', 'crash', 'lower'}
     
     for text in texts:
-        text_lower = text.lower()
-        if any(word in text_lower for word in bullish_words):
-            bullish_count += 1
-        if any(word in text_lower for word in bearish_words):
-            bearish_count += 1
+        sentiments.append(tweet_polarity(text))
+        if '$' in text:
+            price_mentions.update(PRICE_PATTERN.findall(text))
+        bullish, bearish = tweet_leaning(text)
+        bullish_count += bullish
+        bearish_count += bearish
     
-    total = bullish_count + bearish_count
-    return bullish_count / total if total > 0 else 0.5
+    return sentiments, dict(price_mentions), leaning_ratio(bullish_count, bearish_count)
+
+FINANCE_TERMS = ('market', 'stock', 'trade', 'price', 'investor')
+FINANCE_TERM_PATTERN = re.compile('|'.join(FINANCE_TERMS))
+# Break after sentence-ending punctuation, but not inside prices like "$150.25"
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+
+def finance_sentences(text: str) -> str:
+    """The sentences of a tweet that mention a finance term, or "" if none do"""
+    lowered = text.lower()
+    if not FINANCE_TERM_PATTERN.search(lowered):
+        return ""
+    return " ".join(sentence for sentence in SENTENCE_BREAK.split(text)
+                    if FINANCE_TERM_PATTERN.search(sentence.lower()))
+
+@lru_cache(maxsize=1)
+def download_textblob_corpora() -> None:
+    """Fetch the corpora TextBlob needs, at most once per process"""
+    for corpus in TEXTBLOB_CORPORA:
+        nltk.download(corpus, quiet=True)
+
+@lru_cache(maxsize=1024)
+def tweet_noun_phrases(text: str) -> Tuple[str, ...]:
+    """Noun phrases for one tweet, memoized by text"""
+    try:
+        return tuple(TextBlob(text).noun_phrases)
+    except MissingCorpusError:
+        download_textblob_corpora()
+        return tuple(TextBlob(text).noun_phrases)
+
+def warm_nlp_models() -> None:
+    """Load VADER and TextBlob's tagger and chunker, downloading their data if missing"""
+    get_sentiment_analyzer()
+    tweet_noun_phrases("Stock market warmup")
 
 def extract_market_topics(texts: List[str], max_topics: int = 5) -> List[str]:
     """Extract key market-related topics from tweets"""
-    combined_text = " ".join(texts)
-    blob = TextBlob(combined_text)
+    # Chunk each tweet separately so repeated tweets hit the cache
+    # Sentences without a finance term cannot yield a finance phrase, so only tag the rest
+    candidates = (finance_sentences(text) for text in texts)
     # Filter for finance-related phrases
-    finance_phrases = [phrase for phrase in blob.noun_phrases 
-                      if any(term in phrase for term in ['market', 'stock', 'trade', 'price', 'investor'])]
-    return sorted(set(finance_phrases), key=lambda x: len(x), reverse=True)[:max_topics]
+    finance_phrases = {phrase for candidate in candidates if candidate
+                       for phrase in tweet_noun_phrases(candidate)
+                       if FINANCE_TERM_PATTERN.search(phrase)}
+    # Partial selection of the longest phrases instead of sorting them all
+    return nlargest(max_topics, finance_phrases, key=len)
+
+# Capabilities never change at runtime, so serialize them once at import
+CAPABILITIES_BODY = json.dumps({
+    "capabilities": [
+        {
+            "name": "analyze_market_sentiment",
+            "description": "Analyze sentiment for a specific stock symbol",
+            "input_schema": MarketSentimentRequest.model_json_schema(),
+            "output_schema": MarketSentimentResponse.model_json_schema()
+        },
+        {
+            "name": "analyze_market_trends",
+            "description": "Analyze trends across multiple stocks",
+            "input_schema": TrendAnalysisRequest.model_json_schema(),
+            "output_schema": TrendAnalysisResponse.model_json_schema()
+        },
+        {
+            "name": "monitor_market",
+            "description": "Real-time market sentiment monitoring",
+            "input_schema": MarketMonitorRequest.model_json_schema(),
+            "output_schema": MarketMonitorResponse.model_json_schema()
+        }
+    ]
+}).encode()
 
 @mcp.get("/capabilities")
 async def get_capabilities():
-    return {
-        "capabilities": [
-            {
-                "name": "analyze_market_sentiment",
-                "description": "Analyze sentiment for a specific stock symbol",
-                "input_schema": MarketSentimentRequest.schema(),
-                "output_schema": MarketSentimentResponse.schema()
-            },
-            {
-                "name": "analyze_market_trends",
-                "description": "Analyze trends across multiple stocks",
-                "input_schema": TrendAnalysisRequest.schema(),
-                "output_schema": TrendAnalysisResponse.schema()
-            },
-            {
-                "name": "monitor_market",
-                "description": "Real-time market sentiment monitoring",
-                "input_schema": MarketMonitorRequest.schema(),
-                "output_schema": MarketMonitorResponse.schema()
-            }
-        ]
-    }
+    return Response(content=CAPABILITIES_BODY, media_type="application/json")
 
-@mcp.post("/analyze_market_sentiment")
+def analyze_symbol_sentiment(symbol: str, texts: List[str]) -> MarketSentimentResponse:
+    """Build the sentiment response for one symbol's tweets (CPU-bound, no I/O)"""
+    if not texts:
+        return MarketSentimentResponse(
+            symbol=symbol,
+            sentiment_score=0,
+            sentiment_label="neutral",
+            tweet_count=0,
+            common_topics=[],
+            price_mentions={},
+            bullish_ratio=0.5
+        )
+    
+    # Score, count prices and classify every tweet in one pass
+    sentiments, price_mentions, bullish_ratio = summarize_tweets(texts)
+    avg_sentiment = mean_sentiment(sentiments)
+    
+    # Determine sentiment label
+    if avg_sentiment > 0.1:
+        label = "bullish"
+    elif avg_sentiment < -0.1:
+        label = "bearish"
+    else:
+        label = "neutral"
+    
+    # Extract additional market insights
+    market_topics = extract_market_topics(texts)
+    
+    return MarketSentimentResponse(
+        symbol=symbol,
+        sentiment_score=round(avg_sentiment, 3),
+        sentiment_label=label,
+        tweet_count=len(texts),
+        common_topics=market_topics,
+        price_mentions=price_mentions,
+        bullish_ratio=round(bullish_ratio, 2)
+    )
+
+async def fetch_market_sentiment(symbol: str) -> MarketSentimentResponse:
+    """Fetch and analyze recent tweets for a symbol, caching the response"""
+    # Another worker may already have fetched this symbol
+    shared_response = await load_shared_sentiment(symbol)
+    if shared_response is not None:
+        return shared_response
+    
+    # Get tweets about the stock symbol using v2 API with reduced max_results
+    tweets = await search_tweets(build_search_query([symbol]), max_results=10)  # Reduced from 100 to avoid rate limits
+    texts = [tweet.text for tweet in tweets.data] if tweets.data else []
+    
+    # Scoring and topic extraction are CPU-bound, so keep them off the event loop
+    response = await asyncio.to_thread(analyze_symbol_sentiment, symbol, texts)
+    
+    # Cache the response
+    cache_sentiment(symbol, response)
+    await store_shared_sentiment(symbol, response)
+    return response
+
+@mcp.post("/analyze_market_sentiment", response_model=MarketSentimentResponse)
 async def analyze_market_sentiment(request: MarketSentimentRequest) -> MarketSentimentResponse:
+    # "$aapl", "#AAPL" and "AAPL" are the same query, so they share one cache entry
+    symbol = normalize_symbol(request.symbol)
     try:
         # Check cache first
-        if request.symbol in sentiment_cache:
-            timestamp, cached_response = sentiment_cache[request.symbol]
-            if time.time() - timestamp < CACHE_DURATION:
-                return cached_response
-        
-        # Get tweets about the stock symbol using v2 API with reduced max_results
-        search_query = f"${request.symbol} OR #{request.symbol} lang:en -is:retweet"
-        tweets = client.search_recent_tweets(
-            query=search_query,
-            max_results=10,  # Reduced from 100 to avoid rate limits
-            tweet_fields=['created_at', 'public_metrics']
-        )
-        
-        if not tweets.data:
-            response = MarketSentimentResponse(
-                symbol=request.symbol,
-                sentiment_score=0,
-                sentiment_label="neutral",
-                tweet_count=0,
-                common_topics=[],
-                price_mentions={},
-                bullish_ratio=0.5
-            )
-            sentiment_cache[request.symbol] = (time.time(), response)
-            return response
-        
-        # Analyze sentiment
-        texts = [tweet.text for tweet in tweets.data]
-        sentiments = [TextBlob(text).sentiment.polarity for text in texts]
-        avg_sentiment = sum(sentiments) / len(sentiments) if sentiments else 0
-        
-        # Determine sentiment label
-        if avg_sentiment > 0.1:
-            label = "bullish"
-        elif avg_sentiment < -0.1:
-            label = "bearish"
-        else:
-            label = "neutral"
-        
-        # Extract additional market insights
-        price_mentions = extract_price_mentions(texts)
-        bullish_ratio = calculate_bullish_ratio(texts)
-        market_topics = extract_market_topics(texts)
-            
-        response = MarketSentimentResponse(
-            symbol=request.symbol,
-            sentiment_score=round(avg_sentiment, 3),
-            sentiment_label=label,
-            tweet_count=len(texts),
-            common_topics=market_topics,
-            price_mentions=price_mentions,
-            bullish_ratio=round(bullish_ratio, 2)
-        )
+        cached_response = get_cached_sentiment(symbol)
+        if cached_response is not None:
+            return cached_response
         
-        # Cache the response
-        sentiment_cache[request.symbol] = (time.time(), response)
-        return response
+        # Concurrent requests for the same symbol share one in-flight fetch
+        task = sentiment_inflight.get(symbol)
+        if task is None:
+            task = asyncio.ensure_future(fetch_market_sentiment(symbol))
+            sentiment_inflight[symbol] = task
+            task.add_done_callback(lambda _: sentiment_inflight.pop(symbol, None))
+        # Shield so one disconnecting client does not cancel the fetch for the others
+        return await asyncio.shield(task)
         
-    except tweepy_errors.TooManyRequests as e:
+    except (tweepy_errors.TooManyRequests, SearchBudgetExhausted) as e:
         # If rate limited but we have cached data, return it even if expired
-        if request.symbol in sentiment_cache:
-            _, cached_response = sentiment_cache[request.symbol]
+        cached_response = (get_cached_sentiment(symbol, allow_stale=True)
+                           or await load_shared_sentiment(symbol, allow_stale=True))
+        if cached_response is not None:
             return cached_response
             
         # Otherwise, raise the rate limit error
-        retry_after = e.response.headers.get('retry-after', '60 seconds')
+        if isinstance(e, SearchBudgetExhausted):
+            retry_after = f"{e.retry_after:.0f} seconds"
+        else:
+            retry_after = e.response.headers.get('retry-after', '60 seconds')
         raise HTTPException(
             status_code=429,
             detail=f"Twitter API rate limit exceeded. Please try again after {retry_after}."
@@ -228,80 +642,80 @@ async def analyze_market_sentiment(request: MarketSentimentRequest) -> MarketSen
             detail=f"An error occurred while processing your request: {str(e)}"
         )
 
-@mcp.post("/analyze_market_trends")
-async def analyze_market_trends(request: TrendAnalysisRequest) -> TrendAnalysisResponse:
-    try:
-        market_insights = {}
-        all_topics = []
-        total_sentiment = 0
+def analyze_trends(texts_by_symbol: Dict[str, List[str]]) -> TrendAnalysisResponse:
+    """Build the trend response from each symbol's tweets (CPU-bound, no I/O)"""
+    market_insights = {}
+    all_topics = []
+    total_sentiment = 0
+    active_symbols = 0
+    
+    for symbol, texts in texts_by_symbol.items():
+        if not texts:
+            market_insights[symbol] = {
+                "sentiment_score": 0,
+                "tweet_count": 0,
+                "price_mentions": {},
+                "bullish_ratio": 0.5
+            }
+            continue
+        
+        # Score, count prices and classify this symbol's tweets in one pass
+        sentiments, price_mentions, bullish_ratio = summarize_tweets(texts)
+        avg_sentiment = mean_sentiment(sentiments)
+        
+        # Get market topics
+        market_topics = extract_market_topics(texts)
+        all_topics.extend(market_topics)
         
-        for symbol in request.symbols:
-            try:
-                # Get tweets for each symbol
-                search_query = f"symbol:{symbol} OR #{symbol} lang:en -is:retweet"
-                tweets = client.search_recent_tweets(
-                    query=search_query,
-                    max_results=request.min_tweets,
-                    tweet_fields=['created_at', 'public_metrics']
-                )
-                
-                if not tweets.data:
-                    market_insights[symbol] = {
-                        "sentiment_score": 0,
-                        "tweet_count": 0,
-                        "price_mentions": {},
-                        "bullish_ratio": 0.5
-                    }
-                    continue
-                
-                texts = [tweet.text for tweet in tweets.data]
-                sentiments = [TextBlob(text).sentiment.polarity for text in texts]
-                avg_sentiment = sum(sentiments) / len(sentiments) if sentiments else 0
-                
-                # Get market topics and price mentions
-                market_topics = extract_market_topics(texts)
-                all_topics.extend(market_topics)
-                price_mentions = extract_price_mentions(texts)
-                bullish_ratio = calculate_bullish_ratio(texts)
-                
-                # Store insights for this symbol
-                market_insights[symbol] = {
-                    "sentiment_score": avg_sentiment,
-                    "tweet_count": len(texts),
-                    "price_mentions": price_mentions,
-                    "bullish_ratio": bullish_ratio
-                }
-                
-                total_sentiment += avg_sentiment
-            except tweepy_errors.TooManyRequests as e:
-                raise HTTPException(
-                    status_code=429,
-                    detail="Twitter API rate limit exceeded. Please try again later."
-                )
-            except (tweepy_errors.Forbidden, tweepy_errors.Unauthorized) as e:
-                raise HTTPException(
-                    status_code=403,
-                    detail=f"Twitter API access denied for symbol {symbol}. Please check your API access level and credentials. Error: {str(e)}"
-                )
+        # Store insights for this symbol
+        market_insights[symbol] = {
+            "sentiment_score": avg_sentiment,
+            "tweet_count": len(texts),
+            "price_mentions": price_mentions,
+            "bullish_ratio": bullish_ratio
+        }
         
-        if not market_insights:
+        total_sentiment += avg_sentiment
+        active_symbols += 1
+    
+    # Calculate overall market mood
+    avg_market_sentiment = total_sentiment / active_symbols if active_symbols else 0
+    market_mood = "bullish" if avg_market_sentiment > 0.1 else "bearish" if avg_market_sentiment < -0.1 else "neutral"
+    
+    # Find correlated topics across symbols
+    # most_common(k) already does an O(n log k) heap selection
+    correlated_topics = [topic for topic, count in Counter(all_topics).most_common(5)]
+    
+    return TrendAnalysisResponse(
+        market_insights=market_insights,
+        sector_sentiment=market_mood,
+        correlated_topics=correlated_topics,
+        market_mood=market_mood
+    )
+
+@mcp.post("/analyze_market_trends", response_model=TrendAnalysisResponse)
+async def analyze_market_trends(request: TrendAnalysisRequest) -> TrendAnalysisResponse:
+    try:
+        # Get tweets for every symbol with one combined search
+        # min_tweets is Optional, so an explicit null falls back to the default
+        texts_by_symbol = await search_symbols(request.symbols, request.min_tweets or 50)
+        if not texts_by_symbol:
             raise HTTPException(
                 status_code=404,
                 detail="No data found for any of the requested symbols"
             )
         
-        # Calculate overall market mood
-        avg_market_sentiment = total_sentiment / len([s for s in request.symbols if market_insights[s]["tweet_count"] > 0])
-        market_mood = "bullish" if avg_market_sentiment > 0.1 else "bearish" if avg_market_sentiment < -0.1 else "neutral"
-        
-        # Find correlated topics across symbols
-        correlated_topics = [topic for topic, count in Counter(all_topics).most_common(5)]
-        
-        return TrendAnalysisResponse(
-            market_insights=market_insights,
-            sector_sentiment=market_mood,
-            correlated_topics=correlated_topics,
-            market_mood=market_mood
+        # Scoring and topic extraction are CPU-bound, so keep them off the event loop
+        return await asyncio.to_thread(analyze_trends, texts_by_symbol)
+    except (tweepy_errors.TooManyRequests, SearchBudgetExhausted) as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Twitter API rate limit exceeded. Please try again later."
+        )
+    except (tweepy_errors.Forbidden, tweepy_errors.Unauthorized) as e:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Twitter API access denied for symbols {', '.join(request.symbols)}. Please check your API access level and credentials. Error: {str(e)}"
         )
     except HTTPException:
         raise
@@ -311,77 +725,78 @@ async def analyze_market_trends(request: TrendAnalysisRequest) -> TrendAnalysisR
             detail=f"An error occurred while analyzing market trends: {str(e)}"
         )
 
-@mcp.post("/monitor_market")
-async def monitor_market(request: MarketMonitorRequest) -> MarketMonitorResponse:
-    try:
-        sentiment_by_symbol = {}
-        all_texts = []
+def analyze_watchlist(watchlist: List[str], texts_by_symbol: Dict[str, List[str]]) -> MarketMonitorResponse:
+    """Build the monitoring response from each symbol's tweets (CPU-bound, no I/O)"""
+    sentiment_by_symbol = {}
+    price_sentiment = {}
+    all_texts = []
+    total_sentiment = 0
+    active_symbols = 0
+    
+    for symbol, texts in texts_by_symbol.items():
+        if not texts:
+            sentiment_by_symbol[symbol] = 0
+            continue
+        
+        all_texts.extend(texts)
         
-        for symbol in request.watchlist:
-            try:
-                # Get recent tweets for each symbol
-                search_query = f"symbol:{symbol} OR #{symbol} lang:en -is:retweet"
-                tweets = client.search_recent_tweets(
-                    query=search_query,
-                    max_results=50,
-                    tweet_fields=['created_at', 'public_metrics']
-                )
-                
-                if not tweets.data:
-                    sentiment_by_symbol[symbol] = 0
-                    continue
-                
-                texts = [tweet.text for tweet in tweets.data]
-                all_texts.extend(texts)
-                
-                # Calculate sentiment for this symbol
-                sentiments = [TextBlob(text).sentiment.polarity for text in texts]
-                avg_sentiment = sum(sentiments) / len(sentiments) if sentiments else 0
-                sentiment_by_symbol[symbol] = avg_sentiment
-            except tweepy_errors.TooManyRequests as e:
-                raise HTTPException(
-                    status_code=429,
-                    detail="Twitter API rate limit exceeded. Please try again later."
-                )
-            except (tweepy_errors.Forbidden, tweepy_errors.Unauthorized) as e:
-                raise HTTPException(
-                    status_code=403,
-                    detail=f"Twitter API access denied for symbol {symbol}. Please check your API access level and credentials. Error: {str(e)}"
-                )
+        # Score and collect prices in one pass; the monitor reports no bullish ratio, so tweets are not classified
+        sentiments = []
+        prices = set()
+        for text in texts:
+            sentiments.append(tweet_polarity(text))
+            if '$' in text:
+                prices.update(PRICE_PATTERN.findall(text))
+        avg_sentiment = mean_sentiment(sentiments)
+        sentiment_by_symbol[symbol] = avg_sentiment
         
-        if not sentiment_by_symbol:
+        # Calculate price-sentiment correlation from the tweets already grouped per symbol
+        if prices:
+            avg_price = fmean(float(p.strip('$')) for p in prices)
+            price_sentiment[symbol] = avg_price * avg_sentiment
+        
+        # Symbols with a neutral mean do not count towards the overall mood
+        if avg_sentiment != 0:
+            total_sentiment += avg_sentiment
+            active_symbols += 1
+    
+    # Calculate overall market sentiment
+    overall_sentiment = total_sentiment / active_symbols if active_symbols else 0
+    overall_label = "bullish" if overall_sentiment > 0.1 else "bearish" if overall_sentiment < -0.1 else "neutral"
+    
+    # Get trending topics across all symbols
+    trending_topics = extract_market_topics(all_texts) if all_texts else []
+    
+    return MarketMonitorResponse(
+        symbols=watchlist,
+        sentiment_by_symbol=sentiment_by_symbol,
+        overall_market_sentiment=overall_label,
+        trending_topics=trending_topics,
+        price_sentiment_correlation=price_sentiment
+    )
+
+@mcp.post("/monitor_market", response_model=MarketMonitorResponse)
+async def monitor_market(request: MarketMonitorRequest) -> MarketMonitorResponse:
+    try:
+        # Get recent tweets for the whole watchlist with one combined search
+        texts_by_symbol = await search_symbols(request.watchlist, 50)
+        if not texts_by_symbol:
             raise HTTPException(
                 status_code=404,
                 detail="No data found for any of the requested symbols"
             )
         
-        # Calculate overall market sentiment
-        active_symbols = [s for s in sentiment_by_symbol.keys() if sentiment_by_symbol[s] != 0]
-        if not active_symbols:
-            overall_sentiment = 0
-        else:
-            overall_sentiment = sum(sentiment_by_symbol[s] for s in active_symbols) / len(active_symbols)
-        overall_label = "bullish" if overall_sentiment > 0.1 else "bearish" if overall_sentiment < -0.1 else "neutral"
-        
-        # Get trending topics across all symbols
-        trending_topics = extract_market_topics(all_texts) if all_texts else []
-        
-        # Calculate price-sentiment correlation
-        price_sentiment = {}
-        for symbol in request.watchlist:
-            symbol_texts = [t for t in all_texts if symbol.lower() in t.lower()]
-            if symbol_texts:
-                price_mentions = extract_price_mentions(symbol_texts)
-                if price_mentions:
-                    avg_price = sum(float(p.strip('$')) for p in price_mentions.keys()) / len(price_mentions)
-                    price_sentiment[symbol] = avg_price * sentiment_by_symbol[symbol]
-        
-        return MarketMonitorResponse(
-            symbols=request.watchlist,
-            sentiment_by_symbol=sentiment_by_symbol,
-            overall_market_sentiment=overall_label,
-            trending_topics=trending_topics,
-            price_sentiment_correlation=price_sentiment
+        # Scoring and topic extraction are CPU-bound, so keep them off the event loop
+        return await asyncio.to_thread(analyze_watchlist, request.watchlist, texts_by_symbol)
+    except (tweepy_errors.TooManyRequests, SearchBudgetExhausted) as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Twitter API rate limit exceeded. Please try again later."
+        )
+    except (tweepy_errors.Forbidden, tweepy_errors.Unauthorized) as e:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Twitter API access denied for symbols {', '.join(request.watchlist)}. Please check your API access level and credentials. Error: {str(e)}"
         )
     except HTTPException:
         raise
@@ -398,10 +813,12 @@ async def health_check():
     return {"status": "healthy"}
 
 # Root endpoint redirects to docs
+ROOT_BODY = json.dumps({"message": "Welcome to Twitter Market Sentiment MCP", "docs_url": "/docs"}).encode()
+
 @app.get("/")
 async def root():
     """Redirect root to documentation"""
-    return {"message": "Welcome to Twitter Market Sentiment MCP", "docs_url": "/docs"}
+    return Response(content=ROOT_BODY, media_type="application/json")
 
 # Include the MCP router
 app.include_router(mcp) 
\ No newline at end of file